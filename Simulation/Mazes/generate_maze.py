@@ -1,16 +1,45 @@
+import multiprocessing
 import os
+import platform
 import random
-from collections import deque
+import time
+from array import array
+from functools import lru_cache
+
+# NumPy is optional. Without it (or under PyPy, where NumPy goes through a
+# slow C-API emulation layer) the pure-Python flat-buffer path further
+# down is used instead — see RUNNING UNDER PYPY below.
+try:
+    if platform.python_implementation() == "PyPy":
+        raise ImportError
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional — without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 # -----------------------------------------------------------------------
 # CHANGES FROM PREVIOUS VERSION:
 #
-# 1. CENTER PERIMETER FIX: After Prim's runs, forcing all center perimeter
+# 1. CENTER PERIMETER FIX: After carving runs, forcing all center perimeter
 #    walls back to True can seal off cells that were only reachable through
 #    those walls, breaking the maze's connectivity. Fix: we now run a
 #    connectivity check after enforcing center rules and retry generation
 #    from scratch if the maze is broken.
 #
+#    Update: most attempts were failing that check, so the center and
+#    start cell rules are now built into the carve itself (see STEP 1 in
+#    generate_maze). Only the chosen entrance is offered to the carve out
+#    of the 8 center perimeter walls, so the other 7 never need to be
+#    re-sealed and every attempt comes out connected.
+#
 # 2. CONNECTIVITY VALIDATION: A flood fill from (0,0) confirms that every
 #    single cell in the finished maze is reachable before saving. If any
 #    cell is unreachable, the maze is thrown out and regenerated. This is
@@ -26,187 +55,495 @@ from collections import deque
 #    detection code properly.
 # -----------------------------------------------------------------------
 
+# -----------------------------------------------------------------------
+# RUNNING UNDER PYPY:
+#
+#     pypy3 generate_maze.py
+#
+# No third-party packages are needed. When NumPy isn't importable (or
+# the interpreter is PyPy), generate_maze() and save_maze() switch to a
+# plain-Python path that keeps walls in flat array('B') buffers indexed
+# by y * width + x. PyPy's JIT compiles those loops well; on CPython
+# without NumPy the same path still works, just slower.
+# -----------------------------------------------------------------------
+
+# -----------------------------------------------------------------------
+# PACKED WALLS: inside the compiled kernels, horiz and vert are bitsets —
+# a uint64 array with bit (y * width + x) standing for horiz[y, x] or
+# vert[y, x]. A whole 10x10 maze is four 64-bit words. generate_maze()
+# unpacks them back to (height, width) uint8 grids before returning.
+# -----------------------------------------------------------------------
+
+@njit(cache=True)
+def _bit_get(words, i):
+    return (words[i >> 6] >> np.uint64(i & 63)) & np.uint64(1)
+
+
+@njit(cache=True)
+def _bit_clear(words, i):
+    words[i >> 6] &= ~(np.uint64(1) << np.uint64(i & 63))
+
+
+def all_walls(width, height):
+    """Returns a packed wall bitset with every wall present."""
+    return np.full((width * height + 63) // 64, np.iinfo(np.uint64).max,
+                   np.uint64)
+
+
+def pack_walls(grid):
+    """Packs a (height, width) 0/1 wall grid into a uint64 bitset."""
+    bits = np.packbits(grid.ravel() != 0, bitorder='little')
+    buf = np.zeros(-(-len(bits) // 8) * 8, np.uint8)
+    buf[:len(bits)] = bits
+    return buf.view(np.uint64)
+
+
+def unpack_walls(words, width, height):
+    """Unpacks a uint64 wall bitset into a (height, width) uint8 grid."""
+    bits = np.unpackbits(words.view(np.uint8), bitorder='little')
+    return bits[:width * height].reshape(height, width)
+
+
+def maze_buffers(width, height):
+    """
+    Allocates the scratch arrays generate_maze() works in. A batch can
+    allocate one set and pass it to every generate_maze() call instead of
+    allocating fresh arrays per maze; each attempt resets them in place.
+    """
+    return {
+        'horiz':   all_walls(width, height),
+        'vert':    all_walls(width, height),
+        'parent':  np.empty(width * height, np.int32),  # union-find forest
+        'queue':   np.empty(width * height, np.int16),  # flood fill queue
+        'visited': np.empty(width * height, np.uint8),  # flood fill marks
+    }
+
+
+@njit(cache=True, inline='always')
+def _flood(horiz, vert, width, height, queue, visited):
+    """
+    Compiled flood fill behind is_fully_connected(), on packed walls.
+    Uses a fixed-size array queue with head/tail indices — every cell is
+    enqueued at most once, so width*height slots is always enough.
+    `queue` and `visited` are scratch arrays of width*height entries.
+    """
+    visited[:] = 0
+    queue[0] = 0
+    visited[0] = 1
+    head = 0
+    tail = 1
+
+    while head < tail:
+        i = queue[head]
+        head += 1
+        x = i % width
+        y = i // width
+
+        # Try moving North: wall above (x,y) must be absent
+        if y < height - 1 and _bit_get(horiz, i) == 0 and visited[i + width] == 0:
+            visited[i + width] = 1
+            queue[tail] = i + width
+            tail += 1
+
+        # Try moving East: wall to right of (x,y) must be absent
+        if x < width - 1 and _bit_get(vert, i) == 0 and visited[i + 1] == 0:
+            visited[i + 1] = 1
+            queue[tail] = i + 1
+            tail += 1
+
+        # Try moving South: wall above (x, y-1) must be absent
+        if y > 0 and _bit_get(horiz, i - width) == 0 and visited[i - width] == 0:
+            visited[i - width] = 1
+            queue[tail] = i - width
+            tail += 1
+
+        # Try moving West: wall to right of (x-1, y) must be absent
+        if x > 0 and _bit_get(vert, i - 1) == 0 and visited[i - 1] == 0:
+            visited[i - 1] = 1
+            queue[tail] = i - 1
+            tail += 1
+
+    # tail counts every cell that was ever enqueued, i.e. every reachable cell
+    return tail == width * height
+
+
 def is_fully_connected(horiz, vert, width, height):
     """
     Flood fill from (0,0) through the maze using the horiz/vert wall arrays.
     Returns True if every cell is reachable, False if any cell is isolated.
 
-    Wall convention:
-        horiz[y][x] = True means there is a wall ABOVE cell (x, y)
-        vert[y][x]  = True means there is a wall to the RIGHT of cell (x, y)
+    Wall convention (both arrays are uint8 ndarrays of shape (height, width)):
+        horiz[y, x] = 1 means there is a wall ABOVE cell (x, y)
+        vert[y, x]  = 1 means there is a wall to the RIGHT of cell (x, y)
     
-    So to move from (x, y) to (x, y+1): check horiz[y][x] — must be False
-    To move from (x, y) to (x+1, y): check vert[y][x]  — must be False
-    To move from (x, y) to (x, y-1): check horiz[y-1][x] — must be False
-    To move from (x, y) to (x-1, y): check vert[y][x-1]  — must be False
+    So to move from (x, y) to (x, y+1): check horiz[y, x] — must be 0
+    To move from (x, y) to (x+1, y): check vert[y, x]  — must be 0
+    To move from (x, y) to (x, y-1): check horiz[y-1, x] — must be 0
+    To move from (x, y) to (x-1, y): check vert[y, x-1]  — must be 0
+    """
+    if np is None:
+        return _flood_flat(horiz, vert, width, height)
+    _, flood = sized_kernels(width, height)
+    queue   = np.empty(width * height, np.int16)
+    visited = np.empty(width * height, np.uint8)
+    return bool(flood(pack_walls(horiz), pack_walls(vert), queue, visited))
+
+
+# Wall kinds stored in the last column of the edge table
+EDGE_V = 0  # vert[y1, x1]:  wall between (x1, y1) and (x1+1, y1)
+EDGE_H = 1  # horiz[y1, x1]: wall between (x1, y1) and (x1, y1+1)
+
+# The 8 external perimeter walls around the 2x2 center, as (kind, x, y)
+# with the same meaning as an edge table row's (kind, x1, y1)
+CENTER_PERIMETER = (
+    (EDGE_H, 4, 3),  # South wall of (4,4): horiz[3, 4]
+    (EDGE_H, 5, 3),  # South wall of (5,4): horiz[3, 5]
+    (EDGE_H, 4, 5),  # North wall of (4,5): horiz[5, 4]
+    (EDGE_H, 5, 5),  # North wall of (5,5): horiz[5, 5]
+    (EDGE_V, 3, 4),  # West wall of (4,4):  vert[4, 3]
+    (EDGE_V, 3, 5),  # West wall of (4,5):  vert[5, 3]
+    (EDGE_V, 5, 4),  # East wall of (5,4):  vert[4, 5]
+    (EDGE_V, 5, 5),  # East wall of (5,5):  vert[5, 5]
+)
+
+
+def _check_center_fits(width, height):
     """
-    visited = [[False for _ in range(width)] for _ in range(height)]
-    queue = deque()
-    queue.append((0, 0))
-    visited[0][0] = True
-    count = 1
+    Raises ValueError unless every CENTER_PERIMETER wall is an interior
+    wall of a width x height grid, i.e. the center has cells on all sides.
+    """
+    for kind, x, y in CENTER_PERIMETER:
+        if x >= width - (kind == EDGE_V) or y >= height - (kind == EDGE_H):
+            raise ValueError("grid too small for the 2x2 center at (4,4)-(5,5)")
 
-    while queue:
-        x, y = queue.popleft()
 
-        # Try moving North: wall above (x,y) must be absent
-        if y < height - 1 and not horiz[y][x] and not visited[y+1][x]:
-            visited[y+1][x] = True
-            count += 1
-            queue.append((x, y+1))
+@lru_cache(maxsize=None)
+def grid_edges(width, height):
+    """
+    Lists every interior wall of a width x height grid exactly once.
 
-        # Try moving East: wall to right of (x,y) must be absent
-        if x < width - 1 and not vert[y][x] and not visited[y][x+1]:
-            visited[y][x+1] = True
-            count += 1
-            queue.append((x+1, y))
+    Returns an int32 array of shape (n_edges, 5), one row per wall as
+    (x1, y1, x2, y2, kind) with kind EDGE_V or EDGE_H.
+    """
+    rows = []
+    for y in range(height):
+        for x in range(width):
+            if x < width - 1:  rows.append((x, y, x+1, y, EDGE_V))
+            if y < height - 1: rows.append((x, y, x, y+1, EDGE_H))
+    return np.array(rows, np.int32)
 
-        # Try moving South: wall above (x, y-1) must be absent
-        if y > 0 and not horiz[y-1][x] and not visited[y-1][x]:
-            visited[y-1][x] = True
-            count += 1
-            queue.append((x, y-1))
 
-        # Try moving West: wall to right of (x-1, y) must be absent
-        if x > 0 and not vert[y][x-1] and not visited[y][x-1]:
-            visited[y][x-1] = True
-            count += 1
-            queue.append((x-1, y))
+def edge_row(edges, kind, x, y):
+    """Returns the row of `edges` for the wall of `kind` at (x, y)."""
+    hit = (edges[:, 0] == x) & (edges[:, 1] == y) & (edges[:, 4] == kind)
+    return int(np.flatnonzero(hit)[0])
+
 
-    return count == width * height
+@lru_cache(maxsize=None)
+def rule_edges(width, height):
+    """
+    Returns (perimeter, start_east, start_north) for one grid size: the
+    grid_edges() rows of the 8 center perimeter walls (CENTER_PERIMETER
+    order) and of the start cell's East and North walls.
+    """
+    edges = grid_edges(width, height)
+    perimeter = np.array([edge_row(edges, *w) for w in CENTER_PERIMETER])
+    return (perimeter, edge_row(edges, EDGE_V, 0, 0),
+            edge_row(edges, EDGE_H, 0, 0))
+
+
+@njit(cache=True)
+def _find(parent, a):
+    """Union-find root lookup with path compression."""
+    root = a
+    while parent[root] != root:
+        root = parent[root]
+    while parent[a] != root:
+        parent[a], a = root, parent[a]
+    return root
 
 
-def generate_maze(width=10, height=10):
+@njit(cache=True, inline='always')
+def _kruskal(edges, order, horiz, vert, width, height, parent):
     """
-    Generates a single valid maze using Prim's algorithm, then enforces
-    competition rules. Retries automatically if the result fails the
-    connectivity check.
+    Randomized Kruskal's: visits the walls in `order` and knocks each one
+    down if the cells on either side aren't connected yet. Every wall is
+    looked at once, and the result is a perfect maze (a spanning tree).
+    horiz and vert are packed wall bitsets; `parent` is a scratch array of
+    width*height entries for the union-find forest.
+    """
+    for c in range(width * height):
+        parent[c] = c
+    joins_left = width * height - 1
+
+    for k in range(order.shape[0]):
+        i = order[k]
+        c1 = edges[i, 1] * width + edges[i, 0]
+        r1 = _find(parent, c1)
+        r2 = _find(parent, edges[i, 3] * width + edges[i, 2])
+        if r1 != r2:
+            parent[r2] = r1
+            if edges[i, 4] == EDGE_V:
+                _bit_clear(vert, c1)
+            else:
+                _bit_clear(horiz, c1)
+            joins_left -= 1
+            if joins_left == 0:
+                break
+
+
+@lru_cache(maxsize=None)
+def sized_kernels(width, height):
+    """
+    Returns (carve, flood): _kruskal and _flood specialized for one grid
+    size. Numba compiles the closed-over width and height as constants
+    and inlines the kernels into these wrappers (inline='always'), so the
+    cell index math, bounds checks and loop counts are all folded at
+    compile time. Each size gets its own entry in Numba's on-disk cache.
+    """
+    @njit(cache=True)
+    def carve(edges, order, horiz, vert, parent):
+        _kruskal(edges, order, horiz, vert, width, height, parent)
+
+    @njit(cache=True)
+    def flood(horiz, vert, queue, visited):
+        return _flood(horiz, vert, width, height, queue, visited)
+
+    return carve, flood
+
+
+# The competition maze is always 10x10, so build its edge table and
+# compile its kernels up front so the first maze doesn't pay for it
+if np is not None:
+    _b = maze_buffers(10, 10)
+    _carve, _flood10 = sized_kernels(10, 10)
+    _carve(grid_edges(10, 10), np.arange(180), _b['horiz'], _b['vert'],
+           _b['parent'])
+    _flood10(_b['horiz'], _b['vert'], _b['queue'], _b['visited'])
+    del _b, _carve, _flood10
+
 
-    Returns (horiz, vert) wall arrays for the valid maze.
+def generate_maze(width=10, height=10, buffers=None):
     """
+    Generates a single valid maze using randomized Kruskal's, with the
+    competition rules built into the carve. Retries automatically if the
+    result fails the connectivity check.
+
+    `buffers` is an optional set of scratch arrays from maze_buffers() to
+    reuse across calls (ignored on the pure-Python path). They must have
+    been allocated for the same width and height.
+
+    Returns (horiz, vert) uint8 wall arrays of shape (height, width), or
+    flat array('B') buffers indexed by y * width + x when NumPy isn't
+    available.
+    """
+    _check_center_fits(width, height)
+    if np is None:
+        return _generate_maze_flat(width, height)
+
+    if buffers is None:
+        buffers = maze_buffers(width, height)
+    elif buffers['parent'].shape[0] != width * height:
+        # The kernels don't bounds-check, so wrong-sized buffers would
+        # corrupt memory instead of raising
+        raise ValueError(f"buffers were not allocated for a "
+                         f"{width}x{height} maze")
+    horiz  = buffers['horiz']
+    vert   = buffers['vert']
+    parent = buffers['parent']
+    # Everything that depends only on the grid size is worked out once
+    # per size and cached
+    edges = grid_edges(width, height)
+    carve, flood = sized_kernels(width, height)
+    perimeter, start_east, start_north = rule_edges(width, height)
     attempts = 0
 
     while True:
         attempts += 1
 
         # ------------------------------------------------------------------
-        # STEP 1: Prim's Algorithm
-        # Start from (0,0) and randomly carve passages until all cells are
-        # connected. This guarantees a perfect maze (no loops, fully
-        # connected) before we apply any competition-specific rules.
-        # ------------------------------------------------------------------
-        horiz = [[True for _ in range(width)] for _ in range(height)]
-        vert  = [[True for _ in range(width)] for _ in range(height)]
-        seen  = [[False for _ in range(width)] for _ in range(height)]
-
-        candidate_walls = []
-
-        def add_walls(x, y):
-            if x > 0:          candidate_walls.append((x-1, y, x,   y,   'v'))
-            if x < width - 1:  candidate_walls.append((x,   y, x+1, y,   'v'))
-            if y > 0:          candidate_walls.append((x,   y-1, x, y,   'h'))
-            if y < height - 1: candidate_walls.append((x,   y,  x,  y+1, 'h'))
-
-        seen[0][0] = True
-        add_walls(0, 0)
-
-        while candidate_walls:
-            x1, y1, x2, y2, dtype = candidate_walls.pop(
-                random.randint(0, len(candidate_walls) - 1)
-            )
-            # Only remove the wall if exactly one side has been visited
-            if seen[y1][x1] ^ seen[y2][x2]:
-                if dtype == 'v':
-                    vert[y1][x1] = False
-                else:
-                    horiz[y1][x1] = False
-                new_x, new_y = (x2, y2) if not seen[y2][x2] else (x1, y1)
-                seen[new_y][new_x] = True
-                add_walls(new_x, new_y)
-
-        # ------------------------------------------------------------------
-        # STEP 2: Enforce the 2x2 center goal area
+        # STEP 1: Randomized Kruskal's Algorithm
+        # Visit every wall once in random order, knocking it down whenever
+        # the cells on either side aren't already connected. This
+        # guarantees a perfect maze (no loops, fully connected).
         #
-        # The four center cells are (4,4), (4,5), (5,4), (5,5).
-        # Rules:
-        #   - All internal walls within the 2x2 must be removed
-        #   - All external perimeter walls around the 2x2 must be present
-        #   - Exactly one perimeter wall is opened as the single entrance
+        # The competition rules are enforced by which walls the carve is
+        # allowed to touch, rather than patched in afterwards (which used
+        # to disconnect the maze and force retries). A wall left out of
+        # the carve simply stays up, and as long as the walls that are
+        # left in still connect every cell, the carve connects them all.
         #
-        # IMPORTANT: Forcing perimeter walls back to True after Prim's may
-        # disconnect parts of the maze. That's why we validate connectivity
-        # afterwards and retry if needed.
+        #   - Center: exactly one of the 8 perimeter walls around the 2x2
+        #     is picked as the entrance and the other 7 are left out. The
+        #     entrance is then the center's only link to the rest of the
+        #     maze, so the carve must open it.
+        #
+        #   - Start cell (0,0): South and West are already walls (edge of
+        #     maze). One of North/East is picked at random to stay a wall
+        #     and left out; the other is then (0,0)'s only link, so the
+        #     carve must open it. That gives exactly 3 walls with one
+        #     random open passage, which exercises the heading detection
+        #     code in Main.cpp.
         # ------------------------------------------------------------------
+        entrance = random.randrange(8)
+        if random.choice([True, False]):
+            closed_start = start_north  # Wall to the North, passage East
+        else:
+            closed_start = start_east   # Wall to the East, passage North
+        carved = np.ones(len(edges), bool)
+        carved[perimeter] = False
+        carved[perimeter[entrance]] = True
+        carved[closed_start] = False
 
-        # Clear the two internal walls of the 2x2 center
-        # vert[4][4]: wall between (4,4) and (5,4) — remove it
-        # vert[5][4]: wall between (5,4) and... wait, that's the east boundary
-        # Let's be precise:
-        #   Internal vertical wall: between (4,4)&(5,4) = vert[4][4]
-        #                           between (4,5)&(5,5) = vert[5][4] -- NO
-        # vert[y][x] is the wall to the RIGHT of (x,y), so:
-        #   Wall between (4,4) and (5,4): vert[4][4]  (right of x=4 at y=4)
-        #   Wall between (4,5) and (5,5): vert[5][4]  (right of x=4 at y=5)
-        # Internal horizontal wall:
-        #   Wall between (4,4) and (4,5): horiz[4][4] (above y=4 at x=4)
-        #   Wall between (5,4) and (5,5): horiz[4][5] (above y=4 at x=5)
-        vert[4][4]  = False  # between (4,4) and (5,4)
-        vert[5][4]  = False  # between (4,5) and (5,5)
-        horiz[4][4] = False  # between (4,4) and (4,5)
-        horiz[4][5] = False  # between (5,4) and (5,5)
-
-        # Define the 8 external perimeter walls around the 2x2.
-        # Format: (x, y, wall_type) where wall_type is 'h' or 'v'
-        # 'h' entry means horiz[y][x], 'v' entry means vert[y][x]
-        center_perimeter = [
-            (4, 3, 'h'),  # South wall of (4,4): horiz[3][4]  — wall above y=3
-            (5, 3, 'h'),  # South wall of (5,4): horiz[3][5]
-            (4, 5, 'h'),  # North wall of (4,5): horiz[5][4]  — wall above y=5
-            (5, 5, 'h'),  # North wall of (5,5): horiz[5][5]
-            (3, 4, 'v'),  # West wall of (4,4):  vert[4][3]   — right of x=3
-            (3, 5, 'v'),  # West wall of (4,5):  vert[5][3]
-            (5, 4, 'v'),  # East wall of (5,4):  vert[4][5]   — right of x=5
-            (5, 5, 'v'),  # East wall of (5,5):  vert[5][5]
-        ]
-
-        # Force all perimeter walls ON
-        for x, y, t in center_perimeter:
-            if t == 'h':
-                horiz[y][x] = True
-            else:
-                vert[y][x] = True
+        order = np.random.permutation(len(edges))
+        order = order[carved[order]]
 
-        # Open exactly one perimeter wall as the single entrance
-        ex, ey, et = random.choice(center_perimeter)
-        if et == 'h':
-            horiz[ey][ex] = False
-        else:
-            vert[ey][ex] = False
+        horiz.fill(np.iinfo(np.uint64).max)
+        vert.fill(np.iinfo(np.uint64).max)
+        carve(edges, order, horiz, vert, parent)
 
         # ------------------------------------------------------------------
-        # STEP 3: Enforce start cell (0,0) has exactly 3 walls
+        # STEP 2: Clear the internal walls of the 2x2 center
         #
-        # South and West boundaries are already walls (edge of maze).
-        # Randomly place the third wall on either North or East, leaving
-        # exactly one open passage. This exercises the heading detection
-        # code in Main.cpp which figures out which way to face at startup.
+        # The four center cells are (4,4), (4,5), (5,4), (5,5). All internal
+        # walls within the 2x2 must be removed; the carve only opens
+        # enough of them to connect the four cells.
         # ------------------------------------------------------------------
-        if random.choice([True, False]):
-            horiz[0][0] = True   # Wall to the North of (0,0)
-            vert[0][0]  = False  # Open passage to the East
-        else:
-            horiz[0][0] = False  # Open passage to the North
-            vert[0][0]  = True   # Wall to the East of (0,0)
+
+        # vert[y, x] is the wall to the RIGHT of (x,y), so:
+        #   Wall between (4,4) and (5,4): vert[4, 4]  (right of x=4 at y=4)
+        #   Wall between (4,5) and (5,5): vert[5, 4]  (right of x=4 at y=5)
+        # Internal horizontal wall:
+        #   Wall between (4,4) and (4,5): horiz[4, 4] (above y=4 at x=4)
+        #   Wall between (5,4) and (5,5): horiz[4, 5] (above y=4 at x=5)
+        # (packed as bit y * width + x)
+        _bit_clear(vert,  4 * width + 4)  # between (4,4) and (5,4)
+        _bit_clear(vert,  5 * width + 4)  # between (4,5) and (5,5)
+        _bit_clear(horiz, 4 * width + 4)  # between (4,4) and (4,5)
+        _bit_clear(horiz, 4 * width + 5)  # between (5,4) and (5,5)
 
         # ------------------------------------------------------------------
-        # STEP 4: Connectivity validation
+        # STEP 3: Connectivity validation
         #
         # Flood fill from (0,0) through the finished maze. If every cell
-        # is reachable, the maze is valid and we save it. If not, the
-        # center perimeter enforcement disconnected something — discard
-        # this maze and try again from scratch.
+        # is reachable, the maze is valid and we save it. The carve above
+        # can't disconnect anything, so this is purely a safety net — if
+        # it ever fails, discard this maze and try again from scratch.
         # ------------------------------------------------------------------
-        if is_fully_connected(horiz, vert, width, height):
+        if flood(horiz, vert, buffers['queue'], buffers['visited']):
+            if attempts > 1:
+                print(f"  (Took {attempts} attempts to get a connected maze)")
+            return (unpack_walls(horiz, width, height),
+                    unpack_walls(vert, width, height))
+        else:
+            print(f"  Attempt {attempts}: connectivity check failed, retrying...")
+
+
+# -----------------------------------------------------------------------
+# PURE-PYTHON PATH: used when NumPy isn't available (e.g. under PyPy).
+# Same algorithm as above, with walls in flat array('B') buffers — 1 for
+# a wall — indexed by cell c = y * width + x, and the edge table as
+# (c1, c2, kind) tuples whose wall lives at index c1 of horiz or vert.
+# -----------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _flat_edges(width, height):
+    rows = []
+    for y in range(height):
+        for x in range(width):
+            c = y * width + x
+            if x < width - 1:  rows.append((c, c + 1, EDGE_V))
+            if y < height - 1: rows.append((c, c + width, EDGE_H))
+    return tuple(rows)
+
+
+def _flat_edge_row(edges, width, kind, x, y):
+    c = y * width + x
+    return edges.index((c, c + (1 if kind == EDGE_V else width), kind))
+
+
+def _flood_flat(horiz, vert, width, height):
+    queue = [0]
+    visited = array('B', [0]) * (width * height)
+    visited[0] = 1
+    head = 0
+
+    while head < len(queue):
+        i = queue[head]
+        head += 1
+        x = i % width
+        y = i // width
+
+        # North, East, South, West — same checks as _flood()
+        if y < height - 1 and not horiz[i] and not visited[i + width]:
+            visited[i + width] = 1
+            queue.append(i + width)
+        if x < width - 1 and not vert[i] and not visited[i + 1]:
+            visited[i + 1] = 1
+            queue.append(i + 1)
+        if y > 0 and not horiz[i - width] and not visited[i - width]:
+            visited[i - width] = 1
+            queue.append(i - width)
+        if x > 0 and not vert[i - 1] and not visited[i - 1]:
+            visited[i - 1] = 1
+            queue.append(i - 1)
+
+    return len(queue) == width * height
+
+
+def _kruskal_flat(edges, order, horiz, vert, width, height):
+    parent = list(range(width * height))
+    joins_left = width * height - 1
+
+    for i in order:
+        c1, c2, kind = edges[i]
+        r1 = _find(parent, c1)
+        r2 = _find(parent, c2)
+        if r1 != r2:
+            parent[r2] = r1
+            if kind == EDGE_V:
+                vert[c1] = 0
+            else:
+                horiz[c1] = 0
+            joins_left -= 1
+            if joins_left == 0:
+                break
+
+
+def _generate_maze_flat(width, height):
+    """generate_maze() without NumPy. See the comments there for STEPs."""
+    edges = _flat_edges(width, height)
+    perimeter = [_flat_edge_row(edges, width, kind, x, y)
+                 for kind, x, y in CENTER_PERIMETER]
+    start_east  = _flat_edge_row(edges, width, EDGE_V, 0, 0)
+    start_north = _flat_edge_row(edges, width, EDGE_H, 0, 0)
+    attempts = 0
+
+    while True:
+        attempts += 1
+
+        # STEP 1: carve, leaving out 7 of the 8 center perimeter walls and
+        # the start cell's closed wall
+        entrance = random.randrange(8)
+        closed_start = start_north if random.randrange(2) else start_east
+        left_out = set(perimeter[:entrance] + perimeter[entrance + 1:])
+        left_out.add(closed_start)
+
+        order = [i for i in range(len(edges)) if i not in left_out]
+        random.shuffle(order)
+
+        horiz = array('B', [1]) * (width * height)
+        vert  = array('B', [1]) * (width * height)
+        _kruskal_flat(edges, order, horiz, vert, width, height)
+
+        # STEP 2: clear the internal walls of the 2x2 center
+        vert[4 * width + 4]  = 0  # between (4,4) and (5,4)
+        vert[5 * width + 4]  = 0  # between (4,5) and (5,5)
+        horiz[4 * width + 4] = 0  # between (4,4) and (4,5)
+        horiz[4 * width + 5] = 0  # between (5,4) and (5,5)
+
+        # STEP 3: connectivity validation (safety net)
+        if _flood_flat(horiz, vert, width, height):
             if attempts > 1:
                 print(f"  (Took {attempts} attempts to get a connected maze)")
             return horiz, vert
@@ -214,6 +551,40 @@ def generate_maze(width=10, height=10):
             print(f"  Attempt {attempts}: connectivity check failed, retrying...")
 
 
+def _maz_body_flat(horiz, vert, width, height):
+    """save_maze()'s file body, built from flat wall buffers."""
+    rows = []
+    for x in range(width):
+        for y in range(height):
+            c = y * width + x
+            n = 1 if y == height - 1 or horiz[c]         else 0
+            e = 1 if x == width  - 1 or vert[c]          else 0
+            s = 1 if y == 0          or horiz[c - width] else 0
+            w = 1 if x == 0          or vert[c - 1]      else 0
+            rows.append(f"{x} {y} {n} {e} {s} {w}\n")
+    return "".join(rows)
+
+
+@lru_cache(maxsize=None)
+def boundary_masks(width, height):
+    """
+    Returns (top, bottom, left, right) boolean masks of shape
+    (height, width), each marking the cells along one outer edge of the
+    maze. Those sides are always walls in the .maz output.
+    """
+    top, bottom, left, right = np.zeros((4, height, width), bool)
+    top[-1, :]   = True
+    bottom[0, :] = True
+    left[:, 0]   = True
+    right[:, -1] = True
+    return top, bottom, left, right
+
+
+# Built once for the competition size
+if np is not None:
+    boundary_masks(10, 10)
+
+
 def save_maze(horiz, vert, filename, width=10, height=10, target_dir=None):
     """
     Converts horiz/vert wall arrays to the .maz file format and saves it.
@@ -226,46 +597,120 @@ def save_maze(horiz, vert, filename, width=10, height=10, target_dir=None):
         target_dir = r"C:\Users\npg20\Documents\ARC\Micromouse\mms\mazes"
 
     if not os.path.exists(target_dir):
-        os.makedirs(target_dir)
+        # exist_ok: batch workers may race to create the same directory
+        os.makedirs(target_dir, exist_ok=True)
         print(f"Created directory: {target_dir}")
 
     full_path = os.path.join(target_dir, filename)
 
-    with open(full_path, 'w') as f:
-        for x in range(width):
-            for y in range(height):
-                n = 1 if y == height - 1 or horiz[y][x]    else 0
-                e = 1 if x == width  - 1 or vert[y][x]     else 0
-                s = 1 if y == 0          or horiz[y-1][x]  else 0
-                w = 1 if x == 0          or vert[y][x-1]   else 0
-                f.write(f"{x} {y} {n} {e} {s} {w}\n")
+    if np is None:
+        _write_replacing(full_path, _maz_body_flat(horiz, vert, width, height))
+        return full_path
+
+    # Each side of every cell as a (height, width) array. The south wall of
+    # a cell is the north wall of the cell below it, and the west wall is
+    # the east wall of the cell to its left; the outer boundary is always
+    # a wall. (The rows/columns np.roll wraps around land on the boundary,
+    # where the mask overrides them.)
+    top, bottom, left, right = boundary_masks(width, height)
+    n = top    | horiz
+    e = right  | vert
+    s = bottom | np.roll(horiz, 1, axis=0)
+    w = left   | np.roll(vert, 1, axis=1)
+    y, x = np.indices((height, width))
+
+    # The file lists cells column by column (x outer, y inner), so
+    # transpose before flattening.
+    rows = np.stack([a.T.ravel() for a in (x, y, n, e, s, w)], axis=1)
+
+    # Format the whole file in one go and hand it to a single write
+    # (np.savetxt would still format and write one row at a time)
+    body = ("%d %d %d %d %d %d\n" * len(rows)) % tuple(rows.ravel().tolist())
+    _write_replacing(full_path, body)
 
     return full_path
 
 
+def _write_replacing(path, text):
+    """
+    Writes `text` to a temp file and swaps it in over `path`. Replacing the
+    file rather than rewriting it in place means a hard link to the old
+    maze (test_harness.py links failed mazes into its failures folder)
+    keeps the old contents.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
 def generate_and_save_maze(filename="random_test.maz", width=10, height=10,
-                           target_dir=None):
+                           target_dir=None, buffers=None):
     """
     Main entry point. Generates a valid maze and saves it to disk.
+    `buffers` is passed through to generate_maze().
     """
     print(f"Generating {filename}...")
-    horiz, vert = generate_maze(width, height)
+    horiz, vert = generate_maze(width, height, buffers)
     path = save_maze(horiz, vert, filename, width, height, target_dir)
     print(f"Successfully saved: {path}")
     return path
 
 
+# Scratch arrays reused by every maze a batch worker generates
+_worker_buffers = None
+
+
+def _init_worker():
+    """
+    Pool initializer. Forked workers inherit the parent's RNG state, so
+    reseed both generators per process or every worker would produce the
+    same sequence of mazes. Also allocates the worker's scratch arrays
+    once for the whole batch.
+    """
+    global _worker_buffers
+    seed = (os.getpid() ^ time.time_ns()) & 0xFFFFFFFF
+    random.seed(seed)
+    if np is not None:
+        np.random.seed(seed)
+        _worker_buffers = maze_buffers(10, 10)
+
+
+def _batch_worker(task):
+    filename, target_dir = task
+    return generate_and_save_maze(filename, target_dir=target_dir,
+                                  buffers=_worker_buffers)
+
+
+# With NumPy a maze takes well under a millisecond, while each pool worker
+# first spends most of a second importing NumPy and Numba. Below this many
+# mazes a serial loop finishes before the workers would be ready.
+POOL_MIN_COUNT = 5000
+
+
 def generate_batch(count=10, prefix="maze", target_dir=None):
     """
     Generates multiple maze files in one call.
     Useful for building a test suite.
 
+    Small batches run in a loop reusing one set of scratch arrays. Large
+    batches (POOL_MIN_COUNT and up), and every batch on the slower
+    pure-Python path, are spread across one worker process per CPU core.
+
     Example: generate_batch(500) produces maze_001.maz ... maze_500.maz
     """
     print(f"Generating {count} mazes...")
-    for i in range(1, count + 1):
-        filename = f"{prefix}_{i:03d}.maz"
-        generate_and_save_maze(filename, target_dir=target_dir)
+    tasks = [(f"{prefix}_{i:03d}.maz", target_dir) for i in range(1, count + 1)]
+    if np is not None and count < POOL_MIN_COUNT:
+        buffers = maze_buffers(10, 10)
+        for filename, _ in tasks:
+            generate_and_save_maze(filename, target_dir=target_dir,
+                                   buffers=buffers)
+    else:
+        with multiprocessing.Pool(processes=os.cpu_count(),
+                                  initializer=_init_worker) as pool:
+            for _ in pool.imap_unordered(_batch_worker, tasks, chunksize=16):
+                pass
     print(f"Done. {count} mazes generated.")
 
 
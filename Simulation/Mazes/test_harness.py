@@ -21,9 +21,10 @@ Optional: generate fresh mazes before testing by setting
 """
 
 import os
+import shutil
 import subprocess
 import sys
-from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # =============================================================================
 # CONFIGURATION — edit these paths if your folder structure changes
@@ -88,14 +89,16 @@ def compile_mouse():
 
 def load_maze(filepath):
     """
-    Reads a .maz file and returns a wall lookup dictionary.
+    Reads a .maz file and returns its walls packed one byte per cell.
 
     .maz format: each line is  x y n e s w
     where 1 = wall present, 0 = open.
 
-    Returns: dict of (x, y) -> {'n': bool, 'e': bool, 's': bool, 'w': bool}
+    Returns: bytearray of MAZE_WIDTH * MAZE_HEIGHT bytes, indexed by
+             y * MAZE_WIDTH + x. Bit d of each byte is the wall in absolute
+             direction d (bit 0 = North, 1 = East, 2 = South, 3 = West).
     """
-    walls = {}
+    walls = bytearray(MAZE_WIDTH * MAZE_HEIGHT)
     with open(filepath, 'r') as f:
         for line in f:
             line = line.strip()
@@ -105,34 +108,45 @@ def load_maze(filepath):
             x, y, n, e, s, w = int(parts[0]), int(parts[1]), \
                                 int(parts[2]), int(parts[3]), \
                                 int(parts[4]), int(parts[5])
-            walls[(x, y)] = {
-                'n': bool(n),
-                'e': bool(e),
-                's': bool(s),
-                'w': bool(w)
-            }
+            walls[y * MAZE_WIDTH + x] = n | (e << 1) | (s << 2) | (w << 3)
     return walls
 
 
-def wall_in_direction(walls, x, y, direction):
+def relative_walls(walls, x, y, heading):
     """
-    Returns True if there is a wall in the given absolute direction
-    from cell (x, y).
+    Returns (front, right, left) for cell (x, y) as seen by a mouse facing
+    `heading`, each 1 if there is a wall and 0 if open.
 
-    direction: 0=North, 1=East, 2=South, 3=West
+    Rotating the cell's NESW bits right by `heading` lines them up with the
+    mouse: front lands in bit 0, right in bit 1 and left in bit 3.
     """
-    dir_map = {0: 'n', 1: 'e', 2: 's', 3: 'w'}
-    key = dir_map[direction]
-    cell = walls.get((x, y))
-    if cell is None:
-        return True  # treat out-of-bounds as wall
-    return cell[key]
+    if not (0 <= x < MAZE_WIDTH and 0 <= y < MAZE_HEIGHT):
+        return 1, 1, 1  # treat out-of-bounds as wall
+    bits = walls[y * MAZE_WIDTH + x]
+    rotated = ((bits >> heading) | (bits << (4 - heading))) & 0xF
+    return rotated & 1, rotated >> 1 & 1, rotated >> 3 & 1
 
 
 # =============================================================================
 # STEP 3: SIMULATE ONE MAZE RUN
 # =============================================================================
 
+# Commands that always get the same reply, whatever the mouse is doing
+STATIC_RESPONSES = {
+    "mazeWidth":  f"{MAZE_WIDTH}\n",
+    "mazeHeight": f"{MAZE_HEIGHT}\n",
+    "wasReset":   "false\n",
+    "ackReset":   "ack\n",
+}
+
+# Wall queries -> slot in the (front, right, left) tuple from relative_walls
+WALL_QUERIES = {"wallFront": 0, "wallRight": 1, "wallLeft": 2}
+WALL_RESPONSES = ("false\n", "true\n")
+
+# Turns -> how many quarter turns clockwise they rotate the heading
+TURNS = {"turnRight": 1, "turnLeft": 3}
+
+
 def simulate(maze_filepath):
     """
     Runs mouse.exe against a single maze file, simulating the mms protocol.
@@ -144,55 +158,26 @@ def simulate(maze_filepath):
     """
     walls = load_maze(maze_filepath)
 
-    # Mouse internal state (mirrors what Main.cpp tracks)
-    state = {
-        'x':       0,
-        'y':       0,
-        'heading': 0,    # 0=N, 1=E, 2=S, 3=W
-        'steps':   0,
-        'phase':   'SEARCHING',  # for our tracking only
-    }
+    # Mouse internal state (mirrors what Main.cpp tracks). Kept in plain
+    # locals since they are read and written on every command.
+    x       = 0
+    y       = 0
+    heading = 0    # 0=N, 1=E, 2=S, 3=W
+    steps   = 0
 
     # Direction vectors: North, East, South, West
     dx = [0, 1, 0, -1]
     dy = [1, 0, -1, 0]
 
-    def get_wall_front():
-        return wall_in_direction(walls, state['x'], state['y'], state['heading'])
-
-    def get_wall_right():
-        return wall_in_direction(walls, state['x'], state['y'], (state['heading'] + 1) % 4)
-
-    def get_wall_left():
-        return wall_in_direction(walls, state['x'], state['y'], (state['heading'] + 3) % 4)
-
-    def do_move_forward():
-        h = state['heading']
-        nx = state['x'] + dx[h]
-        ny = state['y'] + dy[h]
-
-        # Check if there is actually a wall in the way
-        if wall_in_direction(walls, state['x'], state['y'], h):
-            return "crash"  # mouse tried to move through a wall
-
-        # Check bounds
-        if nx < 0 or nx >= MAZE_WIDTH or ny < 0 or ny >= MAZE_HEIGHT:
-            return "crash"
-
-        state['x'] = nx
-        state['y'] = ny
-        state['steps'] += 1
-        return "ack"
-
-    # Launch mouse.exe as a subprocess, piping stdin/stdout
+    # Launch mouse.exe as a subprocess, piping stdin/stdout. Replies are
+    # buffered and flushed in batches (see below), not line by line.
     try:
         process = subprocess.Popen(
             [EXE_PATH],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,   # captures log() calls from mouse
-            text=True,
-            bufsize=1                 # line buffered
+            bufsize=8192
         )
     except FileNotFoundError:
         return {'success': False, 'steps': 0, 'reason': 'mouse.exe not found'}
@@ -202,103 +187,95 @@ def simulate(maze_filepath):
     reached_center  = False
     reached_start   = False
 
+    # Walls around the mouse only change when it moves or turns, so look
+    # them up once at each of those points instead of on every query
+    around = relative_walls(walls, x, y, heading)
+
+    # The mouse's output is read in raw chunks and split into lines here.
+    # Replies pile up in `pending` and are written in one go once every
+    # complete line in hand has been handled — at that point the mouse
+    # is blocked waiting on them, so nothing is delayed.
+    out_fd  = process.stdout.fileno()
+    partial = b""   # trailing incomplete line from the last read
+    pending = []
+    done    = False
+
     try:
-        while True:
-            # Check step limit
-            if state['steps'] > MAX_STEPS:
-                reason = f"Timeout: exceeded {MAX_STEPS} steps"
-                process.kill()
-                break
+        while not done:
+            if pending:
+                process.stdin.write("".join(pending).encode())
+                process.stdin.flush()
+                pending.clear()
 
-            # Read one command from the mouse
-            line = process.stdout.readline()
-            if not line:
+            chunk = os.read(out_fd, 4096)
+            if not chunk:
                 # Process ended — check if it finished cleanly
                 if reached_center and reached_start:
                     success = True
-                    reason = f"Fast run complete in {state['steps']} steps"
+                    reason = f"Fast run complete in {steps} steps"
                 elif reached_center:
                     reason = "Reached center but did not return to start"
                 else:
                     reason = "Process exited without reaching center"
                 break
 
-            cmd = line.strip()
-
-            # --- Respond to each API command ---
-
-            if cmd == "mazeWidth":
-                process.stdin.write(f"{MAZE_WIDTH}\n")
-                process.stdin.flush()
-
-            elif cmd == "mazeHeight":
-                process.stdin.write(f"{MAZE_HEIGHT}\n")
-                process.stdin.flush()
+            lines = (partial + chunk).split(b"\n")
+            partial = lines.pop()
 
-            elif cmd == "wallFront":
-                result = "true" if get_wall_front() else "false"
-                process.stdin.write(f"{result}\n")
-                process.stdin.flush()
+            for line in lines:
+                # Check step limit
+                if steps > MAX_STEPS:
+                    reason = f"Timeout: exceeded {MAX_STEPS} steps"
+                    process.kill()
+                    done = True
+                    break
 
-            elif cmd == "wallRight":
-                result = "true" if get_wall_right() else "false"
-                process.stdin.write(f"{result}\n")
-                process.stdin.flush()
+                # Commands may carry arguments (e.g. "moveForward 2"), so
+                # dispatch on the first word
+                cmd = line.decode().strip().partition(' ')[0]
 
-            elif cmd == "wallLeft":
-                result = "true" if get_wall_left() else "false"
-                process.stdin.write(f"{result}\n")
-                process.stdin.flush()
+                # --- Respond to each API command ---
 
-            elif cmd.startswith("moveForward"):
-                result = do_move_forward()
-                process.stdin.write(f"{result}\n")
-                process.stdin.flush()
+                if cmd in WALL_QUERIES:
+                    pending.append(WALL_RESPONSES[around[WALL_QUERIES[cmd]]])
 
-                if result == "crash":
-                    reason = f"Crash: mouse moved into a wall at ({state['x']},{state['y']}) heading {state['heading']}"
-                    process.kill()
-                    break
+                elif cmd == "moveForward":
+                    nx = x + dx[heading]
+                    ny = y + dy[heading]
 
-                # Track phase transitions based on position
-                pos = (state['x'], state['y'])
-                if pos in CENTER_CELLS and not reached_center:
-                    reached_center = True
-                elif pos == (0, 0) and reached_center and not reached_start:
-                    reached_start = True
+                    # Crash if there is a wall in the way or the move leaves
+                    # the maze
+                    if around[0] or not (0 <= nx < MAZE_WIDTH and 0 <= ny < MAZE_HEIGHT):
+                        reason = f"Crash: mouse moved into a wall at ({x},{y}) heading {heading}"
+                        process.kill()
+                        done = True
+                        break
 
-            elif cmd == "turnRight":
-                state['heading'] = (state['heading'] + 1) % 4
-                process.stdin.write("ack\n")
-                process.stdin.flush()
+                    x = nx
+                    y = ny
+                    steps += 1
+                    pending.append("ack\n")
 
-            elif cmd == "turnLeft":
-                state['heading'] = (state['heading'] + 3) % 4
-                process.stdin.write("ack\n")
-                process.stdin.flush()
+                    # Track phase transitions based on position
+                    pos = (x, y)
+                    if pos in CENTER_CELLS and not reached_center:
+                        reached_center = True
+                    elif pos == (0, 0) and reached_center and not reached_start:
+                        reached_start = True
 
-            elif cmd == "wasReset":
-                process.stdin.write("false\n")
-                process.stdin.flush()
+                    around = relative_walls(walls, x, y, heading)
 
-            elif cmd == "ackReset":
-                process.stdin.write("ack\n")
-                process.stdin.flush()
+                elif cmd in TURNS:
+                    heading = (heading + TURNS[cmd]) % 4
+                    around = relative_walls(walls, x, y, heading)
+                    pending.append("ack\n")
 
-            # Visual commands — acknowledge silently, no response needed
-            elif (cmd.startswith("setWall") or
-                  cmd.startswith("clearWall") or
-                  cmd.startswith("setColor") or
-                  cmd.startswith("clearColor") or
-                  cmd.startswith("clearAllColor") or
-                  cmd.startswith("setText") or
-                  cmd.startswith("clearText") or
-                  cmd.startswith("clearAllText")):
-                pass  # no response required for visual commands
+                elif cmd in STATIC_RESPONSES:
+                    pending.append(STATIC_RESPONSES[cmd])
 
-            else:
-                # Unknown command — log it but don't crash the harness
-                pass
+                # Anything else is a visual command (setWall, setColor,
+                # setText, clearAllColor, ...) or unknown — neither needs a
+                # response, so it is ignored without crashing the harness
 
     except Exception as e:
         reason = f"Harness error: {str(e)}"
@@ -315,7 +292,7 @@ def simulate(maze_filepath):
 
     return {
         'success': success,
-        'steps':   state['steps'],
+        'steps':   steps,
         'reason':  reason
     }
 
@@ -324,11 +301,35 @@ def simulate(maze_filepath):
 # STEP 4: BATCH RUNNER
 # =============================================================================
 
+def save_failure(maze_path, maze_name):
+    """
+    Puts a failed maze into FAILURES_DIR. Hard-links it when possible (no
+    data copied), falling back to a real copy across drives or on
+    filesystems without hard links. generate_maze.py replaces maze files
+    rather than rewriting them, so regenerating mazes later won't change
+    the saved failure. Does nothing if the maze already is that file
+    (e.g. rerunning with MAZES_DIR pointed at FAILURES_DIR).
+    """
+    dst = os.path.join(FAILURES_DIR, maze_name)
+    if os.path.exists(dst):
+        if os.path.samefile(maze_path, dst):
+            return
+        os.remove(dst)  # left over from an earlier run
+    try:
+        os.link(maze_path, dst)
+    except OSError:
+        shutil.copy(maze_path, dst)
+
+
 def run_all_mazes():
     """
     Finds every .maz file in MAZES_DIR, runs the mouse against each one,
-    and prints a summary report. Failed mazes are copied to FAILURES_DIR
-    so you can load them into mms to inspect visually.
+    and prints a summary report. Failed mazes are saved to FAILURES_DIR
+    (hard-linked, or copied where that isn't possible) so you can load
+    them into mms to inspect visually.
+
+    Each run is its own mouse.exe process and mostly waits on it, so the
+    mazes are spread across one worker per CPU core.
     """
     # Gather all maze files
     maze_files = sorted([
@@ -356,23 +357,26 @@ def run_all_mazes():
     print(f"{'#':<6} {'Maze':<30} {'Result':<10} {'Steps':<8} Reason")
     print("-" * 80)
 
-    for i, maze_path in enumerate(maze_files, 1):
-        maze_name = os.path.basename(maze_path)
-        result = simulate(maze_path)
+    # pool.map hands results back in maze order, so the table still prints
+    # in order as runs finish
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = pool.map(simulate, maze_files, chunksize=4)
+        for i, (maze_path, result) in enumerate(zip(maze_files, results), 1):
+            maze_name = os.path.basename(maze_path)
 
-        status = "PASS" if result['success'] else "FAIL"
-        print(f"{i:<6} {maze_name:<30} {status:<10} {result['steps']:<8} {result['reason']}")
+            status = "PASS" if result['success'] else "FAIL"
+            print(f"{i:<6} {maze_name:<30} {status:<10} {result['steps']:<8} {result['reason']}")
 
-        total_steps += result['steps']
-        if result['success']:
-            passed += 1
-        else:
-            failed += 1
-            failures.append((maze_name, maze_path, result['reason']))
+            total_steps += result['steps']
+            if result['success']:
+                passed += 1
+            else:
+                failed += 1
+                failures.append((maze_name, maze_path, result['reason']))
 
-            # Copy failed maze to failures folder for mms inspection
-            import shutil
-            shutil.copy(maze_path, os.path.join(FAILURES_DIR, maze_name))
+    # Link (or copy) failed mazes into the failures folder for mms inspection
+    for name, path, _ in failures:
+        save_failure(path, name)
 
     # Summary
     print("\n" + "=" * 80)